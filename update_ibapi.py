@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Update the vendored ibapi sources from the Interactive Brokers download page.
+
+Finds the TWS API (stable or latest) Mac/Unix zip on
+https://interactivebrokers.github.io, compares its version against what is
+checked in here, and with --update downloads the zip and copies the
+pythonclient sources (ibapi/, tests/, setup.py, ...) over this repo.
+
+Intended to run in CI: findings are appended to $GITHUB_OUTPUT when set.
+"""
+
+import argparse
+import io
+import os
+import re
+import shutil
+import sys
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+IB_DOWNLOAD_PAGE = "https://interactivebrokers.github.io"
+
+CHANNELS = ("stable", "latest")
+
+_session = None
+
+
+def get_session():
+    """one session for the page fetch and the zip fetch so the TLS connection
+    to interactivebrokers.github.io is set up once and kept alive; built
+    lazily so --help and local-only paths never pay the requests import.
+    We only ever talk to one host, so a two-connection pool is plenty."""
+
+    global _session
+    if _session is None:
+        import requests
+
+        # only advertise brotli when something present can decode it,
+        # otherwise response.content would be raw brotli bytes
+        try:
+            import brotli  # noqa: F401
+
+            encodings = "gzip, deflate, br"
+        except ImportError:
+            encodings = "gzip, deflate"
+
+        from urllib3.util.retry import Retry
+
+        _session = requests.Session()
+        _session.headers["Accept-Encoding"] = encodings
+        _session.headers["User-Agent"] = "ibapi-updater"
+        # a scheduled CI run shouldn't fall over on one transient 5xx
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=2,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504),
+            ),
+        )
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+# the page structure is stable and we only need three facts per row
+# (channel label, version, zip link), so plain regexes over the HTML beat
+# building and walking a parse tree; bytes patterns run straight over
+# response.content without decoding the whole page
+TR_RE = re.compile(rb"<tr[^>]*>(.*?)</tr>", re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(rb"<[^>]+>")
+API_VERSION_RE = re.compile(rb"API\s+(\d+\.\d+(?:\.\d+)?)")
+MACUNIX_HREF_RE = re.compile(rb"href=\"([^\"]*twsapi_macunix[^\"]*\.zip)\"")
+# bytes pattern: version parsing works on raw file/zip-member bytes, so
+# the whole module source never has to be UTF-8 decoded
+VERSION_DICT_RE = re.compile(
+    rb"VERSION\s*=\s*{\s*['\"]major['\"]\s*:\s*(\d+)\s*,"
+    rb"\s*['\"]minor['\"]\s*:\s*(\d+)\s*,"
+    rb"\s*['\"]micro['\"]\s*:\s*(\d+)\s*}"
+)
+
+# the only part of the archive we vendor; the rest (Java/C++ sources,
+# samples, docs) is hundreds of MB we never look at
+PYTHONCLIENT_PREFIX = "IBJts/source/pythonclient/"
+
+# the pythonclient pieces that land in the project root
+ITEMS_TO_COPY = [
+    "ibapi",
+    "setup.py",
+    "MANIFEST.in",
+    "pylintrc",
+    "README.md",
+    "tests",
+    "tox.ini",
+]
+
+
+def find_download_urls_and_versions():
+    """returns {channel: (zip_url, version)} for both channels from a single
+    page fetch and parse"""
+
+    response = get_session().get(IB_DOWNLOAD_PAGE, timeout=30)
+    response.raise_for_status()
+
+    results = {}
+    for row_match in TR_RE.finditer(response.content):
+        row_html = row_match.group(1)
+        href_match = MACUNIX_HREF_RE.search(row_html)
+        if href_match is None:
+            continue
+        row_text = TAG_RE.sub(b" ", row_html)
+        for channel in CHANNELS:
+            if channel in results:
+                continue
+            if f"TWS API {channel.capitalize()}".encode() not in row_text:
+                continue
+            match = API_VERSION_RE.search(row_text)
+            if match:
+                href = href_match.group(1).decode().lstrip("/")
+                url = IB_DOWNLOAD_PAGE + "/" + href
+                results[channel] = (url, match.group(1).decode())
+        if len(results) == len(CHANNELS):
+            break
+
+    return results
+
+
+def find_download_url_and_version(version_type):
+    """returns (zip_url, version) for the given channel ("stable" or "latest")"""
+
+    return find_download_urls_and_versions().get(version_type, (None, None))
+
+
+def download_file(url, fileobj):
+    """streams url into the given writable binary file object; returns the
+    response's ETag, if any, for cache validation"""
+
+    response = get_session().get(url, stream=True, timeout=60)
+    response.raise_for_status()
+    total = int(response.headers.get("content-length", 0))
+
+    # when writing to a real file, tell the kernel the access is one
+    # sequential sweep; BytesIO and friends have no fileno
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fileobj.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except (OSError, AttributeError):
+            pass
+
+    written = 0
+    last_percent = -1
+    # 1 MiB chunks: a ~50 MB zip takes a few dozen writes instead of the
+    # ~6400 an 8 KiB chunk size produced
+    for chunk in response.iter_content(chunk_size=1 << 20):
+        fileobj.write(chunk)
+        written += len(chunk)
+        if total:
+            # redraw only on whole-percent changes: at most ~100 writes
+            # to the terminal for the whole download
+            percent = written * 100 // total
+            if percent != last_percent:
+                last_percent = percent
+                print(f"\rDownloading... {percent}%", end="", flush=True)
+    print()
+    return response.headers.get("ETag")
+
+
+def find_pythonclient_prefix(zip_ref):
+    """returns the archive path prefix of IBJts/source/pythonclient/, which
+    may sit one directory deeper in some releases"""
+
+    for name in zip_ref.namelist():
+        idx = name.find(PYTHONCLIENT_PREFIX)
+        if idx != -1:
+            return name[: idx + len(PYTHONCLIENT_PREFIX)]
+    return None
+
+
+def parse_version(content):
+    """pulls the VERSION dict out of raw ibapi/__init__.py bytes"""
+
+    match = VERSION_DICT_RE.search(content)
+    if match:
+        return b".".join(match.groups()).decode()
+    return None
+
+
+def get_version_from_ibapi(init_file):
+    """reads the VERSION dict out of an ibapi/__init__.py on disk"""
+
+    try:
+        with open(init_file, "rb") as f:
+            # the VERSION dict sits in the first few lines; no need to
+            # pull the whole module source in
+            content = f.read(4096)
+    except FileNotFoundError:
+        return None
+    return parse_version(content)
+
+
+def get_current_version(project_root, version_type):
+    """returns the version we last installed, trying the channel stamp file,
+    the legacy stamp file, then the checked-in ibapi/__init__.py"""
+
+    for stamp in (
+        project_root / f".ibapi_{version_type}_version",
+        project_root / ".ibapi_version",
+    ):
+        try:
+            with open(stamp, "r") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            continue
+
+    return get_version_from_ibapi(project_root / "ibapi" / "__init__.py")
+
+
+def extract_member(zip_ref, info, target):
+    """inflates one archive member to target (ZipFile reads are thread-safe)"""
+
+    with zip_ref.open(info) as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+
+def member_matches(target, info):
+    """True when the file on disk already has the member's size and CRC"""
+
+    try:
+        if target.stat().st_size != info.file_size:
+            return False
+        crc = 0
+        with open(target, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                crc = zlib.crc32(block, crc)
+    except OSError:
+        return False
+    return crc == info.CRC
+
+
+def install_from_zip(zip_ref, dest_path):
+    """writes the vendored pythonclient pieces straight from the archive into
+    the project root; returns the installed version"""
+
+    prefix = find_pythonclient_prefix(zip_ref)
+    if prefix is None:
+        raise RuntimeError("pythonclient directory not found in archive")
+
+    # read the version straight from the archive member, once, before
+    # touching the working tree
+    source_version = parse_version(zip_ref.read(prefix + "ibapi/__init__.py"))
+    if source_version is None:
+        raise RuntimeError("no version found in archive's ibapi/__init__.py")
+
+    # in-place merge: most incremental updates touch a handful of files,
+    # so unchanged ones (same size and CRC as the member) are left alone
+    # instead of being deleted and rewritten
+    dest_root = dest_path.resolve()
+    to_write = []
+    expected = {}
+    for info in zip_ref.infolist():
+        if not info.filename.startswith(prefix):
+            continue
+        relative = info.filename[len(prefix):]
+        if not relative:
+            continue
+        top = relative.split("/", 1)[0]
+        if top not in ITEMS_TO_COPY:
+            continue
+
+        target = dest_path / relative
+        # writing members ourselves lost extractall's name sanitization:
+        # refuse anything ('..', absolute paths) that resolves outside
+        # the project root
+        if not target.resolve().is_relative_to(dest_root):
+            raise RuntimeError(f"unsafe path in archive: {info.filename}")
+        if info.is_dir():
+            target.mkdir(parents=True, exist_ok=True)
+            continue
+        if "/" in relative:
+            expected.setdefault(top, set()).add(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if member_matches(target, info):
+            continue
+        to_write.append((info, target))
+
+    # zlib releases the GIL while inflating, so a small pool overlaps
+    # decompression and writes of independent members
+    with ThreadPoolExecutor(max_workers=min(os.cpu_count() or 1, 8)) as pool:
+        list(pool.map(lambda item: extract_member(zip_ref, *item), to_write))
+
+    # drop files (and then empty dirs) that no longer exist upstream
+    for top, keep in expected.items():
+        for path in sorted((dest_path / top).rglob("*"), reverse=True):
+            if path.is_file() and path not in keep:
+                path.unlink()
+            elif path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+
+    return source_version
+
+
+def cached_zip_path(version):
+    """returns the cache location for this version's zip ($IBAPI_ZIP_CACHE
+    or ~/.cache/ibapi_setup), or None when the version is unknown"""
+
+    if version is None:
+        return None
+    cache_dir = os.environ.get("IBAPI_ZIP_CACHE", "~/.cache/ibapi_setup")
+    cache_dir = Path(os.path.expanduser(cache_dir))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir / f"twsapi_{version}.zip"
+
+
+def zip_cache_is_valid(cache_path, download_url):
+    """revalidates a cached zip with a conditional GET; a 304 costs no body
+    bytes. Entries without a recorded ETag (or offline runs) are trusted
+    as-is since they are keyed by version."""
+
+    try:
+        etag = cache_path.with_suffix(".etag").read_text().strip()
+    except FileNotFoundError:
+        return True
+    import requests
+
+    try:
+        response = get_session().get(
+            download_url,
+            headers={"If-None-Match": etag},
+            stream=True,
+            timeout=30,
+        )
+        response.close()
+        return response.status_code == 304
+    except requests.RequestException:
+        return True
+
+
+def perform_update(download_url, project_root, available_version=None):
+    """downloads the zip (or revalidates a cached copy) and installs
+    pythonclient over the repo; returns the installed version"""
+
+    cache_path = cached_zip_path(available_version)
+    if (
+        cache_path is not None
+        and cache_path.exists()
+        and zip_cache_is_valid(cache_path, download_url)
+    ):
+        print(f"Using cached {cache_path.name}")
+        with zipfile.ZipFile(cache_path, strict_timestamps=False) as zip_ref:
+            return install_from_zip(zip_ref, project_root)
+
+    # the zip stays in memory: writing it to disk only to re-read it for
+    # extraction would double the I/O
+    zip_buffer = io.BytesIO()
+    etag = download_file(download_url, zip_buffer)
+    if cache_path is not None:
+        # publish atomically so an interrupted run never leaves a torn
+        # cache entry behind
+        part_path = cache_path.with_suffix(".part")
+        part_path.write_bytes(zip_buffer.getbuffer())
+        os.replace(part_path, cache_path)
+        if etag:
+            cache_path.with_suffix(".etag").write_text(etag + "\n")
+
+    with zipfile.ZipFile(zip_buffer, strict_timestamps=False) as zip_ref:
+        return install_from_zip(zip_ref, project_root)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check for (and optionally install) a new TWS API version"
+    )
+    parser.add_argument(
+        "version_type",
+        nargs="?",
+        choices=["stable", "latest", "both"],
+        default="stable",
+        help="which release channel to track ('both' checks stable and "
+        "latest with a single page fetch)",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="download and install the new version if one is available",
+    )
+    args = parser.parse_args()
+
+    project_root = Path(__file__).resolve().parent
+    channels = CHANNELS if args.version_type == "both" else (args.version_type,)
+
+    results = find_download_urls_and_versions()
+
+    exit_code = 0
+    output_lines = []
+    summary_lines = []
+    for channel in channels:
+        download_url, available_version = results.get(channel, (None, None))
+        if download_url is None:
+            print(f"Could not find a {channel} download on {IB_DOWNLOAD_PAGE}")
+            exit_code = 1
+            continue
+
+        current_version = get_current_version(project_root, channel)
+
+        has_update = False
+        if current_version == available_version:
+            # the common scheduled-run case: nothing changed, so skip the
+            # numeric comparison (and, below, all download work)
+            pass
+        elif current_version is None:
+            has_update = True
+        else:
+            # Version handles the differing precision ("10.30" vs "10.30.1")
+            # the old hand-rolled tuple loop padded for
+            from packaging.version import Version
+
+            has_update = Version(available_version) > Version(current_version)
+
+        if args.update:
+            if has_update:
+                new_version = perform_update(
+                    download_url, project_root, available_version
+                )
+                stamp = project_root / f".ibapi_{channel}_version"
+                with open(stamp, "w") as f:
+                    f.write(new_version + "\n")
+                print(f"Updated to {new_version}")
+            else:
+                print(f"Already up to date ({current_version})")
+
+        key = f"{channel}_" if args.version_type == "both" else ""
+        output_lines.append(
+            f"{key}has_update={'true' if has_update else 'false'}\n"
+            f"{key}available_version={available_version}\n"
+            f"{key}download_url={download_url}\n"
+        )
+        summary_lines.append(
+            f"Channel: {channel}\n"
+            f"Current version: {current_version or 'unknown'}\n"
+            f"Available version: {available_version}\n"
+            f"Download URL: {download_url}\n"
+            f"Update available: {has_update}\n"
+        )
+
+    github_output = os.environ.get("GITHUB_OUTPUT")
+    if github_output and output_lines:
+        with open(github_output, "a") as f:
+            f.write("".join(output_lines))
+
+    sys.stdout.write("".join(summary_lines))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())